@@ -1,9 +1,11 @@
 '''A set of helper types and classes common to all subset cover models.'''
-from collections import defaultdict
 from dataclasses import dataclass
+from functools import lru_cache
 from itertools import combinations
 from itertools import product
 from typing import Any
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Tuple
 from typing import Callable
@@ -12,9 +14,47 @@ from typing import Callable
 VariableConstructor = Callable[[str], Any]
 
 
+def elements_to_mask(elements: Iterable[int]) -> int:
+    '''Encode a set of elements as an int with bit e set for each element e.'''
+    mask = 0
+    for element in elements:
+        mask |= 1 << element
+    return mask
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    '''Yield the elements of a bitmask-encoded set in increasing order.'''
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+def iter_k_subsets_bits(n: int, k: int) -> Iterator[int]:
+    '''Yield the bitmasks of all k-element subsets of range(n), in increasing
+    numeric order, using Gosper's hack.'''
+    if k == 0:
+        yield 0
+        return
+    mask = (1 << k) - 1
+    limit = 1 << n
+    while mask < limit:
+        yield mask
+        low_bit = mask & -mask
+        ripple = mask + low_bit
+        mask = (((ripple ^ mask) >> 2) // low_bit) | ripple
+
+
+@lru_cache(maxsize=None)
+def mask_elements(mask: int) -> Tuple[int, ...]:
+    '''The elements of a bitmask-encoded set, decoded once per mask.'''
+    return tuple(iter_bits(mask))
+
+
 @dataclass(frozen=True)
 class ChoiceSetMember:
     '''Whether an element is chosen to be in a choice set.'''
+    __slots__ = ('element', 'choice_set_index', 'variable')
     element: int
     choice_set_index: int
     variable: Any
@@ -23,7 +63,9 @@ class ChoiceSetMember:
 @dataclass(frozen=True)
 class IsHit:
     '''Whether a hit set is hit by a given choice set.'''
-    hit_set: Tuple[int]
+    __slots__ = ('hit_set', 'choice_set_index', 'variable')
+    # The hit set as a bitmask, see elements_to_mask.
+    hit_set: int
     choice_set_index: int
     variable: Any
 
@@ -31,6 +73,7 @@ class IsHit:
 @dataclass(frozen=True)
 class HitSet:
     '''The sets you're trying to hit by picking choice sets.'''
+    __slots__ = ('set_size', 'elements', 'variable')
     set_size: int
     elements: List[int]
     variable: Any
@@ -38,69 +81,201 @@ class HitSet:
 
 
 class ChoiceSetMembers:
-    '''A class that constructs ChoiceSetMember instances and the associated lookups.'''
+    '''A class that constructs ChoiceSetMember instances and the associated lookups.
+
+    Elements and choice set indices are expected to be 0-based ranges, so that
+    lookups can index directly into dense (choice_set_index, element) tables.
+
+    If name_variables is False, every variable is constructed with the empty
+    name. Only solvers that identify variables by object rather than by name
+    (pywraplp, CP-SAT) may use this.
+    '''
     def __init__(self, elements, choice_set_indices,
-                 variable_constructor: VariableConstructor):
-        self.memberships = [
-            ChoiceSetMember(element=element,
-                            choice_set_index=choice_set_index,
-                            variable=variable_constructor(
-                                f"Member_({choice_set_index},{element})"))
-            for (element,
-                 choice_set_index) in product(elements, choice_set_indices)
-        ]
+                 variable_constructor: VariableConstructor,
+                 name_variables: bool = True):
+        # member_matrix[choice_set_index][element] -> ChoiceSetMember, and
+        # var_matrix the same for the raw solver variables. Variables are
+        # created element-major, which fixes their order in the solver.
+        self.memberships = []
+        self.member_matrix = [[None] * len(elements)
+                              for _ in choice_set_indices]
+        for (element,
+             choice_set_index) in product(elements, choice_set_indices):
+            name = (f"Member_({choice_set_index},{element})"
+                    if name_variables else "")
+            mem = ChoiceSetMember(element=element,
+                                  choice_set_index=choice_set_index,
+                                  variable=variable_constructor(name))
+            self.memberships.append(mem)
+            self.member_matrix[choice_set_index][element] = mem
 
-        self.memberships_lookup = dict(
-            ((mem.choice_set_index, mem.element), mem)
-            for mem in self.memberships)
+        self.var_matrix = [
+            tuple(mem.variable for mem in row) for row in self.member_matrix
+        ]
 
-        self.memberships_by_choice_set = defaultdict(set)
-        for membership in self.memberships:
-            self.memberships_by_choice_set[membership.choice_set_index].add(
-                membership)
 
     def for_choice_set_index_and_element(self, choice_set_index, element):
-        return self.memberships_lookup[(choice_set_index, element)]
+        return self.member_matrix[choice_set_index][element]
+
+    def variables_for(self, choice_set_index, hit_set: int):
+        '''The member variables of a choice set for each element of the
+        bitmask-encoded hit_set.'''
+        row = self.var_matrix[choice_set_index]
+        return [row[element] for element in mask_elements(hit_set)]
 
     def for_choice_set_index(self, choice_set_index):
-        return self.memberships_by_choice_set[choice_set_index]
+        '''The members of a choice set, in increasing order of element.'''
+        return self.member_matrix[choice_set_index]
+
+    def variables_for_choice_set_index(self, choice_set_index):
+        '''The member variables of a choice set, in increasing order of
+        element, as a tuple built once at construction.'''
+        return self.var_matrix[choice_set_index]
+
+    def mask_terms(self, choice_set_index):
+        '''The member variables of a choice set, each scaled by 2^element, so
+        that their sum is the bitmask of the choice set's elements.'''
+        return [(1 << element) * variable
+                for element, variable in enumerate(
+                    self.var_matrix[choice_set_index])]
 
     def grouped_by_choice_set(self):
-        return self.memberships_by_choice_set.values()
+        return self.member_matrix
+
+    def variables_grouped_by_choice_set(self):
+        return self.var_matrix
 
     def all_variables(self):
         return [mem.variable for mem in self.memberships]
 
 
+@lru_cache(maxsize=None)
+def _subset_masks(num_elements: int, subset_size: int) -> Tuple[int, ...]:
+    return tuple(iter_k_subsets_bits(num_elements, subset_size))
+
+
+@lru_cache(maxsize=None)
+def _subset_tuples(num_elements: int,
+                   subset_size: int) -> Tuple[Tuple[int, ...], ...]:
+    return tuple(combinations(range(num_elements), subset_size))
+
+
+def make_subset_masks(elements, subset_size):
+    '''All subsets of elements of the given size, as bitmasks.
+
+    Like ChoiceSetMembers, this expects elements to be range(len(elements)).
+    The result is cached by size, so the solvers in an experiment share one
+    enumeration.
+    '''
+    return _subset_masks(len(elements), subset_size)
+
+
+def make_subset_tuples(elements, subset_size):
+    '''All subsets of elements of the given size, as sorted tuples.
+
+    The tuple counterpart of make_subset_masks, with the same expectations
+    on elements and the same caching.
+    '''
+    return _subset_tuples(len(elements), subset_size)
+
+
 def make_hit_sets(elements, hit_set_size):
-    return [
-        tuple(sorted(elts)) for elts in combinations(elements, hit_set_size)
-    ]
+    '''All hit sets of the given size, as bitmasks.'''
+    return make_subset_masks(elements, hit_set_size)
+
+
+def iter_submasks(mask: int, subset_size: int) -> Iterator[int]:
+    '''Yield the bitmasks of all subsets of mask with subset_size elements.'''
+    elts = mask_elements(mask)
+    for positions in iter_k_subsets_bits(len(elts), subset_size):
+        yield elements_to_mask(elts[p] for p in iter_bits(positions))
+
+
+def containing_sets(hit_sets, choice_sets, hit_set_size):
+    '''Map each hit set mask to the list of choice set masks containing it.
+
+    Built by enumerating the hit sets inside each choice set, which touches
+    only the nonzero entries of the hit set/choice set incidence relation
+    rather than testing every pair.
+    '''
+    containing = {hit_set: [] for hit_set in hit_sets}
+    for choice_set in choice_sets:
+        for hit_set in iter_submasks(choice_set, hit_set_size):
+            containing[hit_set].append(choice_set)
+    return containing
+
+
+def greedy_cover(num_elements, choice_set_size, hit_set_size,
+                 num_choice_sets) -> List[int]:
+    '''Greedily pick up to num_choice_sets choice sets, each covering as many
+    still-uncovered hit sets as possible, stopping early once every hit set
+    is covered.
+
+    Returns the chosen choice sets as bitmasks in decreasing order, which is
+    the order the models' symmetry breaking constraints require.
+    '''
+    elements = list(range(num_elements))
+    hit_sets = make_hit_sets(elements, hit_set_size)
+    hit_set_rank = {hit_set: rank for rank, hit_set in enumerate(hit_sets)}
+
+    # Each candidate's coverage is a bitmask over hit set ranks, so the gain
+    # of a candidate is a single popcount against the uncovered mask.
+    candidates = []
+    for choice_set in make_subset_masks(elements, choice_set_size):
+        coverage = 0
+        for hit_set in iter_submasks(choice_set, hit_set_size):
+            coverage |= 1 << hit_set_rank[hit_set]
+        candidates.append((choice_set, coverage))
+
+    uncovered = (1 << len(hit_sets)) - 1
+    chosen = []
+    while uncovered and len(chosen) < num_choice_sets:
+        best_gain, best_set, best_coverage = 0, None, 0
+        for choice_set, coverage in candidates:
+            gain = bin(coverage & uncovered).count('1')
+            if gain > best_gain:
+                best_gain, best_set, best_coverage = gain, choice_set, coverage
+        if best_set is None:
+            break
+        chosen.append(best_set)
+        uncovered &= ~best_coverage
+
+    return sorted(chosen, reverse=True)
 
 
 class IsHits:
     '''A class that defines IsHit variables for each
     hit set and choice set pair.
+
+    name_variables is as for ChoiceSetMembers.
     '''
     def __init__(self, hit_sets, choice_set_indices,
-                 variable_constructor: VariableConstructor):
+                 variable_constructor: VariableConstructor,
+                 name_variables: bool = True):
         self.is_hit_variables = [
             IsHit(hit_set=hit_set,
                   choice_set_index=choice_set_index,
                   variable=variable_constructor(
-                      f"IsHit_({hit_set},{choice_set_index})")) for hit_set,
+                      f"IsHit_({hit_set},{choice_set_index})"
+                      if name_variables else "")) for hit_set,
             choice_set_index in product(hit_sets, choice_set_indices)
         ]
 
         self.lookup = {(x.hit_set, x.choice_set_index): x
                        for x in self.is_hit_variables}
 
-        self.by_hit_set = defaultdict(set)
+        self.by_hit_set = {}
+        self.by_choice_set = {}
         for is_hit in self.is_hit_variables:
-            self.by_hit_set[is_hit.hit_set].add(is_hit)
+            self.by_hit_set.setdefault(is_hit.hit_set, []).append(is_hit)
+            self.by_choice_set.setdefault(is_hit.choice_set_index,
+                                          []).append(is_hit)
 
     def all(self):
         return self.is_hit_variables
 
     def for_hit_set(self, hit_set):
         return self.by_hit_set[hit_set]
+
+    def for_choice_set_index(self, choice_set_index):
+        return self.by_choice_set[choice_set_index]
@@ -10,10 +10,25 @@ class Experiment:
     order: int  # order within a family, for plotting
 
 
-experiments = []
+def search_family(family, num_elements, choice_set_size, hit_set_size,
+                  search_range):
+    '''Yield one experiment per num_choice_sets in search_range.'''
+    for i in search_range:
+        yield Experiment(
+            family=family,
+            order=i,
+            parameters=SubsetCoverParameters(
+                num_elements=num_elements,
+                choice_set_size=choice_set_size,
+                hit_set_size=hit_set_size,
+                num_choice_sets=i,
+            ),
+        )
 
-experiments.append(
-    Experiment(
+
+def iter_experiments():
+    '''Yield the experiments lazily, so they are only built as they are run.'''
+    yield Experiment(
         family='small sat',
         order=0,
         parameters=SubsetCoverParameters(
@@ -22,11 +37,9 @@ experiments.append(
             hit_set_size=2,
             num_choice_sets=7,
         ),
-    ))
-
+    )
 
-experiments.append(
-    Experiment(
+    yield Experiment(
         family='small unsat',
         order=0,
         parameters=SubsetCoverParameters(
@@ -35,11 +48,9 @@ experiments.append(
             hit_set_size=2,
             num_choice_sets=3,
         ),
-    ))
-
+    )
 
-experiments.append(
-    Experiment(
+    yield Experiment(
         family='large sat',
         order=0,
         parameters=SubsetCoverParameters(
@@ -48,11 +59,9 @@ experiments.append(
             hit_set_size=3,
             num_choice_sets=50,
         ),
-    ))
-
+    )
 
-experiments.append(
-    Experiment(
+    yield Experiment(
         family='large unsat',
         order=0,
         parameters=SubsetCoverParameters(
@@ -61,34 +70,16 @@ experiments.append(
             hit_set_size=3,
             num_choice_sets=3,
         ),
-    ))
-
-
-experiments.extend([
-    Experiment(
-        family='sat search n=7',
-        order=i,
-        parameters=SubsetCoverParameters(
-            num_elements=7,
-            choice_set_size=3,
-            hit_set_size=2,
-            num_choice_sets=i,
-        ),
     )
-    for i in range(1, 20)
-])
 
+    yield from search_family('sat search n=7',
+                             num_elements=7,
+                             choice_set_size=3,
+                             hit_set_size=2,
+                             search_range=range(1, 20))
 
-experiments.extend([
-    Experiment(
-        family='search n=8',
-        order=i,
-        parameters=SubsetCoverParameters(
-            num_elements=8,
-            choice_set_size=3,
-            hit_set_size=2,
-            num_choice_sets=i,
-        ),
-    )
-    for i in range(1, 20)
-])
+    yield from search_family('search n=8',
+                             num_elements=8,
+                             choice_set_size=3,
+                             hit_set_size=2,
+                             search_range=range(1, 20))
@@ -1,3 +1,5 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
 from subset_cover import SubsetCoverParameters
 from subset_cover_ilp import SubsetCoverILP
 from subset_cover_z3_brute_force import SubsetCoverZ3BruteForce
@@ -42,12 +44,26 @@ methods = [
 ]
 
 
+def _solve(method, params):
+    return method().solve(params)
+
+
 def run_experiment(params):
+    '''Run each method on params in its own process, and print the results
+    as they finish.'''
     header = True
-    for method in methods:
-        solution = method().solve(params)
-        print_table(params, solution, header=header, method=method.__name__)
-        header = False
+    with ProcessPoolExecutor(max_workers=len(methods)) as executor:
+        futures = {
+            executor.submit(_solve, method, params): method
+            for method in methods
+        }
+        for future in as_completed(futures):
+            method = futures[future]
+            print_table(params,
+                        future.result(),
+                        header=header,
+                        method=method.__name__)
+            header = False
 
 if __name__ == "__main__":
     print("hard feasible")
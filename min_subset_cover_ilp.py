@@ -1,8 +1,9 @@
-from common_model import ChoiceSetMember
-from common_model import ChoiceSetMembers
-from common_model import IsHit
-from common_model import IsHits
+from common_model import containing_sets
+from common_model import iter_bits
 from common_model import make_hit_sets
+from common_model import make_subset_masks
+from functools import lru_cache
+from math import ceil
 from math import comb
 from subset_cover import SolveStatus
 from subset_cover import SubsetCover
@@ -10,7 +11,22 @@ from subset_cover import SubsetCoverParameters
 from subset_cover import SubsetCoverSolution
 from time import time
 
-from ortools.linear_solver import pywraplp
+from ortools.sat.python import cp_model
+
+
+@lru_cache(maxsize=32)
+def covering_structure(num_elements, choice_set_size, hit_set_size):
+    '''
+    The candidate choice sets, and for each hit set the candidates that
+    contain it. These depend only on the problem shape, so they are
+    computed once per shape.
+    '''
+    elements = list(range(num_elements))
+    hit_sets = make_hit_sets(elements, hit_set_size)
+    candidates = make_subset_masks(elements, choice_set_size)
+    containing = containing_sets(hit_sets, candidates, hit_set_size)
+    return tuple(candidates), tuple(
+        tuple(covering) for covering in containing.values())
 
 
 class MinSubsetCoverILP(SubsetCover):
@@ -20,105 +36,114 @@ class MinSubsetCoverILP(SubsetCover):
 
     Ignores the num_choice_sets parameter, and instead tries to minimize
     the number of choice sets itself.
+
+    Every variable is binary, so the program is solved with CP-SAT rather
+    than a MIP solver. Instead of one large optimization problem, it solves
+    a sequence of feasibility problems "is there a cover with at most k
+    choice sets?", binary searching on k.
     '''
     def solve(self, parameters: SubsetCoverParameters) -> SubsetCoverSolution:
-        solver = pywraplp.Solver.CreateSolver('min_subset_cover', 'SCIP')
-
-        def make_binary_var(name: str):
-            return solver.IntVar(0, 1, name)
-
         '''
-        We choose a number of choice sets that is guaranteed to have at least
-        one feasible solution. Then we minimize the total number of choice sets
-        chosen.
+        Rather than a fixed number of choice set slots whose members are
+        variables, which needs an IsHit variable for every (hit set, slot)
+        pair, we have one Chosen variable per candidate choice set, i.e.,
+        per subset of size choice_set_size. Whether a candidate contains a
+        hit set is then known up front.
+        '''
+        # Shared by every feasibility check below, and across solves of the
+        # same problem shape.
+        candidates, covering_candidates = covering_structure(
+            parameters.num_elements, parameters.choice_set_size,
+            parameters.hit_set_size)
+        num_hit_sets = len(covering_candidates)
 
-        What is guaranteed to work is (num_elements choose hit_set_size),
-        since at worst each choice set can have a given hit set as a subset.
         '''
-        num_choice_sets = comb(parameters.num_elements,
-                               parameters.hit_set_size)
-        choice_set_indices = list(range(num_choice_sets))
-
-        elements = list(range(parameters.num_elements))
-        hit_sets = make_hit_sets(elements, parameters.hit_set_size)
-
-        choice_set_members = ChoiceSetMembers(elements, choice_set_indices,
-                                              make_binary_var)
-        is_hits = IsHits(hit_sets, choice_set_indices, make_binary_var)
-        is_chosens = dict((i, solver.IntVar(0, 1, f"Chosen_{i}"))
-                          for i in choice_set_indices)
+        Each choice set contains at most (choice_set_size choose
+        hit_set_size) hit sets, which bounds the answer from below. Picking
+        one containing candidate per hit set bounds it from above.
         '''
-        Creates constraints of the form, for each choice set C
-
-            sum(Member_{C, elt}) == K * Chosen{C}
+        hit_sets_per_choice_set = comb(parameters.choice_set_size,
+                                       parameters.hit_set_size)
+        lower = 0
+        if hit_sets_per_choice_set:
+            lower = ceil(num_hit_sets / hit_sets_per_choice_set)
+        upper = min(num_hit_sets, len(candidates))
 
-        This has the effect of making the LHS sum either 0 (no members are
-        chosen) or K, where K is the parameter-specified choice set size.
-
-        This causes the binary variable Chosen{C} to act as a switch
-        on the presence of this cardinality constraint.
-        '''
-        for choice_set_index in choice_set_indices:
-            members = choice_set_members.for_choice_set_index(choice_set_index)
-            lhs = sum([x.variable for x in members])
-            rhs = parameters.choice_set_size * is_chosens[choice_set_index]
-            solver.Add(lhs == rhs)
-
-        # Each hit set must be hit by at least one choice set
-        for hit_set in hit_sets:
-            is_hits_for_hit_set = is_hits.for_hit_set(hit_set)
-            is_hit_vars = [x.variable for x in is_hits_for_hit_set]
-            solver.Add(sum(is_hit_vars) >= 1)
-
-        # For each choice set and IsHit, the IsHit value is 1 forces
-        # the corresponding hit set to have all its elements in the choice set.
-        for is_hit in is_hits.all():
-            choice_set_index = is_hit.choice_set_index
-            hit_set = is_hit.hit_set
-
-            lhs = sum(
-                choice_set_members.for_choice_set_index_and_element(
-                    choice_set_index, element).variable for element in hit_set)
-            rhs = parameters.hit_set_size * is_hit.variable
-
-            # if IsHit == 1, then the LHS must be at least hit_set_size, but
-            # because there are only hit_set_size many terms in LHS, that is also
-            # the max value, so all the variables in LHS must equal 1, i.e., all
-            # the hit set elements are in the choice set.
-            solver.Add(lhs >= rhs)
-
-        # Since each choice set must have the same size,
-        solver.Minimize(sum(is_chosens.values()))
         time_limit_seconds = 60 * 5
-        solver.SetTimeLimit(time_limit_seconds * 1000)
+        best = None
+        status = SolveStatus.INFEASIBLE
 
         start = time()
-        status = solver.Solve()
+        while lower <= upper:
+            remaining_seconds = time_limit_seconds - (time() - start)
+            if remaining_seconds <= 0:
+                status = SolveStatus.UNKNOWN
+                break
+
+            max_choice_sets = (lower + upper) // 2
+            trial_status, chosen = self.solve_with_at_most(
+                candidates, covering_candidates, max_choice_sets, best,
+                remaining_seconds)
+
+            if trial_status == SolveStatus.SOLVED:
+                # The cover found may use fewer sets than allowed.
+                best = chosen
+                upper = len(chosen) - 1
+            elif trial_status == SolveStatus.INFEASIBLE:
+                lower = max_choice_sets + 1
+            else:
+                status = SolveStatus.UNKNOWN
+                break
         end = time()
         elapsed = end - start
 
-        if status == pywraplp.Solver.OPTIMAL or status == pywraplp.Solver.FEASIBLE:
-            sets = []
-            for choice_set_index in choice_set_indices:
-                if is_chosens[choice_set_index].solution_value():
-                    members = choice_set_members.for_choice_set_index(
-                        choice_set_index)
-                    nonzero_members = tuple(
-                        sorted([
-                            x.element for x in members
-                            if x.variable.solution_value() == 1
-                        ]))
-                    sets.append(nonzero_members)
+        if best is not None:
+            sets = [tuple(iter_bits(candidate)) for candidate in best]
             print(sorted(sets))
             # return sorted(sets)
             return SubsetCoverSolution(status=SolveStatus.SOLVED,
                                        solve_time_seconds=elapsed)
-        elif status == pywraplp.Solver.INFEASIBLE:
-            return SubsetCoverSolution(status=SolveStatus.INFEASIBLE,
-                                       solve_time_seconds=elapsed)
+        return SubsetCoverSolution(status=status, solve_time_seconds=elapsed)
+
+    def solve_with_at_most(self, candidates, covering_candidates,
+                           max_choice_sets, hint, time_limit_seconds):
+        '''
+        Check whether some set of at most max_choice_sets candidates covers
+        every hit set, returning the status and the chosen candidates.
+
+        If hint is a previously found cover, the search is started from it.
+        '''
+        model = cp_model.CpModel()
+        is_chosens = dict(
+            (candidate, model.NewBoolVar(f"Chosen_{candidate}"))
+            for candidate in candidates)
+
+        # Each hit set must be a subset of at least one chosen candidate
+        for covering in covering_candidates:
+            model.AddBoolOr([is_chosens[candidate] for candidate in covering])
+
+        model.Add(sum(is_chosens.values()) <= max_choice_sets)
+
+        if hint is not None:
+            hinted = set(hint)
+            for candidate, is_chosen in is_chosens.items():
+                model.AddHint(is_chosen, candidate in hinted)
+
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = time_limit_seconds
+        solver.parameters.num_search_workers = 8
+        status = solver.Solve(model)
+
+        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+            chosen = [
+                candidate for candidate, is_chosen in is_chosens.items()
+                if solver.BooleanValue(is_chosen)
+            ]
+            return SolveStatus.SOLVED, chosen
+        elif status == cp_model.INFEASIBLE:
+            return SolveStatus.INFEASIBLE, None
         else:
-            return SubsetCoverSolution(status=SolveStatus.UNKNOWN,
-                                       solve_time_seconds=elapsed)
+            return SolveStatus.UNKNOWN, None
 
 
 if __name__ == "__main__":
@@ -1,9 +1,9 @@
 from collections import defaultdict
 from common_model import ChoiceSetMember
 from common_model import ChoiceSetMembers
-from common_model import HitSet
+from common_model import make_hit_sets
+from common_model import mask_elements
 from dataclasses import dataclass
-from itertools import combinations
 from itertools import product
 from math import comb
 from subset_cover import SolveStatus
@@ -14,10 +14,13 @@ from time import time
 from typing import Any
 from typing import List
 from z3 import And
-from z3 import Implies
-from z3 import Int
+from z3 import Bool
+from z3 import Not
 from z3 import Or
+from z3 import PbEq
+from z3 import PbGe
 from z3 import Solver
+from z3 import is_true
 from z3 import sat
 from z3 import unknown
 from z3 import unsat
@@ -28,7 +31,15 @@ class MinSubsetCoverZ3Integer(SubsetCover):
     An implementation of the subset cover problem that uses Z3,
     and encodes the problem in such a way that does not require
     an enumeration of all possible choice sets.
+
+    Despite the name, the variables are Bools and the cardinality
+    constraints are pseudo-boolean, so Z3 can use its SAT core rather than
+    linear integer arithmetic.
     '''
+    def __init__(self, verbose: bool = False):
+        '''If verbose, print the chosen sets after a successful solve.'''
+        self.verbose = verbose
+
     def solve(self, parameters: SubsetCoverParameters) -> SubsetCoverSolution:
         num_choice_sets = int(
             2 * comb(parameters.num_elements, parameters.hit_set_size) /
@@ -37,7 +48,7 @@ class MinSubsetCoverZ3Integer(SubsetCover):
         choice_sets = list(range(num_choice_sets))
         hit_set_size = parameters.hit_set_size
 
-        choice_set_members = ChoiceSetMembers(elements, choice_sets, Int)
+        choice_set_members = ChoiceSetMembers(elements, choice_sets, Bool)
 
         '''
         TODO: finish this
@@ -48,70 +59,68 @@ class MinSubsetCoverZ3Integer(SubsetCover):
         '''
         # each choice set must have a specific size
         choice_set_size_constraints = [
-            sum(mem.variable
-                for mem in memberships) == parameters.choice_set_size
-            for memberships in choice_set_members.grouped_by_choice_set()
+            PbEq([(var, 1) for var in member_vars],
+                 parameters.choice_set_size) for member_vars in
+            choice_set_members.variables_grouped_by_choice_set()
         ]
 
-        hit_sets = dict((tuple(sorted(elts)),
-                         HitSet(set_size=hit_set_size,
-                                elements=elts,
-                                variable=Int(f"Hit_{elts}")))
-                        for elts in combinations(elements, hit_set_size))
-
-        implications = []
-        '''
-        For a hit set like (1,2), we construct the implication,
-        for each choice set i,
-
-            Member_(i,1) == 1 and Member_(i,2) == 1 => Hit_(1,2) == 1
+        # Choice sets are interchangeable, so any solution can be permuted
+        # into one where the choice sets are in decreasing order of their
+        # element bitmasks. With weights w_e = 2^e, mask(i) >= mask(j) is
+        # written as the pseudo-boolean constraint
+        #
+        #   sum(w_e * M_(i,e)) + sum(w_e * Not(M_(j,e))) >= sum(w_e)
+        weights = [1 << elt for elt in elements]
+
+        def mask_at_least(choice_set_index, other_index):
+            row = choice_set_members.variables_for_choice_set_index(
+                choice_set_index)
+            other_row = choice_set_members.variables_for_choice_set_index(
+                other_index)
+            return PbGe([(var, w) for var, w in zip(row, weights)] +
+                        [(Not(var), w) for var, w in zip(other_row, weights)],
+                        sum(weights))
+
+        symmetry_breaking_constraints = [
+            mask_at_least(choice_set_index, next_index)
+            for choice_set_index, next_index in zip(choice_sets,
+                                                    choice_sets[1:])
+        ]
 
         '''
-        for choice_set_index in choice_sets:
-            mems = choice_set_members.for_choice_set_index(choice_set_index)
-            for membership_subset in combinations(mems, hit_set_size):
-                hit_set = hit_sets[tuple(
-                    sorted([mem.element for mem in membership_subset]))]
-                implications.append(
-                    Implies(
-                        And(*[mem.variable == 1 for mem in membership_subset]),
-                        hit_set.variable == 1))
-        '''
-        For a hit set like (1,2), we construct the implication:
+        Every hit set must be contained in some choice set. For a hit set
+        like (1,2), this is the disjunction
 
-            Hit_(1,2) == 1 =>
-              Member(1, 1) == 1 AND Member(1, 2) == 1
+              Member(1, 1) AND Member(1, 2)
               OR
-              Member(2, 1) == 1 AND Member(2, 2) == 1
+              Member(2, 1) AND Member(2, 2)
               OR
               ...
-        '''
-        for hit_set in hit_sets.values():
-            clauses = []
-
-            for choice_set in choice_sets:
-                mems = [
-                    choice_set_members.for_choice_set_index_and_element(
-                        choice_set, elt) for elt in hit_set.elements
-                ]
-                clauses.append(And(*[mem.variable == 1 for mem in mems]))
 
-            implications.append(Implies(hit_set.variable == 1, Or(*clauses)))
+        This used to be written with a Hit variable per hit set, asserted
+        true, plus implications in both directions between Hit and its
+        members. Since Hit is always true, the Member => Hit implications
+        are vacuous and Hit => OR(...) is just OR(...), so the disjunction
+        is asserted directly.
+        '''
+        # The element indices of each hit set and the member variable rows
+        # are computed once up front, so the loop below only gathers
+        # variables by index.
+        hit_set_elements = [
+            mask_elements(hit_set)
+            for hit_set in make_hit_sets(elements, hit_set_size)
+        ]
+        var_rows = choice_set_members.variables_grouped_by_choice_set()
+        coverage_constraints = [
+            Or(*[And(*[row[element] for element in elts]) for row in var_rows])
+            for elts in hit_set_elements
+        ]
 
         solver = Solver()
         solver.set("timeout", 60 * 5 * 1000)
-        for size_constraint in choice_set_size_constraints:
-            solver.add(size_constraint)
-
-        for var in choice_set_members.all_variables():
-            solver.add(var >= 0)
-            solver.add(var <= 1)
-
-        for hit_set in hit_sets.values():
-            solver.add(hit_set.variable == 1)
-
-        for impl in implications:
-            solver.add(impl)
+        solver.add(*choice_set_size_constraints)
+        solver.add(*symmetry_breaking_constraints)
+        solver.add(*coverage_constraints)
 
         start = time()
         result = solver.check()
@@ -124,20 +133,22 @@ class MinSubsetCoverZ3Integer(SubsetCover):
             return SubsetCoverSolution(status=SolveStatus.UNKNOWN,
                                        solve_time_seconds=end - start)
 
-        model = solver.model()
+        if self.verbose:
+            model = solver.model()
 
-        realized_choice_sets = []
-        for choice_set_index in choice_sets:
-            mems = choice_set_members.for_choice_set_index(choice_set_index)
-            choice_set = list(
-                sorted([
+            realized_choice_sets = []
+            for choice_set_index in choice_sets:
+                mems = choice_set_members.for_choice_set_index(
+                    choice_set_index)
+                choice_set = [
                     mem.element for mem in mems
-                    if model.evaluate(mem.variable).as_long() > 0
-                ]))
-            realized_choice_sets.append(choice_set)
+                    if is_true(model.evaluate(mem.variable))
+                ]
+                realized_choice_sets.append(choice_set)
+
+            print(f"Chose {len(realized_choice_sets)} sets: "
+                  f"{realized_choice_sets}")
 
-        print(
-            f"Chose {len(realized_choice_sets)} sets: {realized_choice_sets}")
         return SubsetCoverSolution(status=SolveStatus.SOLVED,
                                    solve_time_seconds=end - start)
 
@@ -152,4 +163,4 @@ if __name__ == "__main__":
                                    hit_set_size=l,
                                    num_choice_sets=max_num_sets)
     print(params)
-    print(MinSubsetCoverZ3Integer().solve(params))
+    print(MinSubsetCoverZ3Integer(verbose=True).solve(params))
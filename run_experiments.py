@@ -1,5 +1,5 @@
 from collections import defaultdict
-from experiments import experiments
+from experiments import iter_experiments
 from subset_cover_ilp import SubsetCoverILP
 from subset_cover_z3_brute_force import SubsetCoverZ3BruteForce
 from subset_cover_z3_cardinality import SubsetCoverZ3Cardinality
@@ -15,10 +15,13 @@ methods = [
 
 if __name__ == "__main__":
     data = defaultdict(lambda: defaultdict(list))
-    for experiment in experiments:
+    # Each solve builds its own model, so one instance per method is reused
+    # across all experiments.
+    solvers = [(method, method()) for method in methods]
+    for experiment in iter_experiments():
         print(experiment)
-        for method in methods:
-            result = method().solve(experiment.parameters)
+        for method, solver in solvers:
+            result = solver.solve(experiment.parameters)
             print(f"{method.__name__}: {result.solve_time_seconds} ({result.status})")
             data[experiment.family][method.__name__].insert(
                     experiment.order, result.solve_time_seconds)
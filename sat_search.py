@@ -1,4 +1,7 @@
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count
 from subset_cover import SubsetCoverParameters
+from subset_cover_cp import NUM_SEARCH_WORKERS
 from subset_cover_cp import SubsetCoverCP
 from subset_cover_ilp import SubsetCoverILP
 from subset_cover_z3_brute_force import SubsetCoverZ3BruteForce
@@ -30,6 +33,10 @@ methods = [
 ]
 
 
+def _solve(method, params):
+    return method().solve(params)
+
+
 if __name__ == "__main__":
     # print("hard feasible")
     # run_experiment(hard_feasible)
@@ -37,16 +44,33 @@ if __name__ == "__main__":
     # print("hard infeasible")
     # run_experiment(hard_infeasible)
 
-    header = True
-    for i in range(8, 13):
-        for method in methods:
-            params = SubsetCoverParameters(
-                num_elements=8,
-                choice_set_size=3,
-                hit_set_size=2,
-                num_choice_sets=i,
-            )
-
-            solution = method().solve(params)
-            print_table(params, solution, header=header, method=method.__name__)
+    # The probes are independent, so they are solved concurrently and
+    # reported in order. Each CP-SAT solve already runs NUM_SEARCH_WORKERS
+    # threads, so only as many probes run at once as there are cores for,
+    # which keeps the reported solve times free of contention.
+    probes = [(method,
+               SubsetCoverParameters(
+                   num_elements=8,
+                   choice_set_size=3,
+                   hit_set_size=2,
+                   num_choice_sets=i,
+               )) for i in range(8, 13) for method in methods]
+
+    threads_per_probe = max(
+        NUM_SEARCH_WORKERS if method is SubsetCoverCP else 1
+        for method in methods)
+    max_workers = min(len(probes),
+                      max(1, (cpu_count() or 1) // threads_per_probe))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_solve, method, params)
+            for method, params in probes
+        ]
+        header = True
+        for (method, params), future in zip(probes, futures):
+            print_table(params,
+                        future.result(),
+                        header=header,
+                        method=method.__name__)
             header = False
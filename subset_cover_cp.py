@@ -2,7 +2,9 @@ from common_model import ChoiceSetMember
 from common_model import ChoiceSetMembers
 from common_model import IsHit
 from common_model import IsHits
+from common_model import greedy_cover
 from common_model import make_hit_sets
+from common_model import mask_elements
 from subset_cover import SolveStatus
 from subset_cover import SubsetCover
 from subset_cover import SubsetCoverParameters
@@ -13,79 +15,114 @@ from time import time
 from ortools.linear_solver import pywraplp
 from ortools.sat.python import cp_model
 
+# Parallel CP-SAT search workers used by each solve.
+NUM_SEARCH_WORKERS = 8
+
 
 class SubsetCoverCP(SubsetCover):
     '''
     An implementation of the subset cover problem formulated as
     a constraint satisfaction problem.
 
-    This is identical to SubsetCoverILP,
-    but there is no optimization objective.
+    This has the same variables as SubsetCoverILP, but there is no
+    optimization objective, and the hit set constraints are boolean
+    constraints rather than linear inequalities.
     '''
     def solve(self, parameters: SubsetCoverParameters) -> SubsetCoverSolution:
         model = cp_model.CpModel()
 
         def make_binary_var(name: str):
-            return model.NewIntVar(0, 1, name)
+            return model.NewBoolVar(name)
 
         elements = list(range(parameters.num_elements))
         choice_set_indices = list(range(parameters.num_choice_sets))
         hit_sets = make_hit_sets(elements, parameters.hit_set_size)
 
-        choice_set_members = ChoiceSetMembers(elements, choice_set_indices,
-                                              make_binary_var)
-        is_hits = IsHits(hit_sets, choice_set_indices, make_binary_var)
+        # Variables are only referenced by object, so they go unnamed.
+        choice_set_members = ChoiceSetMembers(elements,
+                                              choice_set_indices,
+                                              make_binary_var,
+                                              name_variables=False)
+        is_hits = IsHits(hit_sets,
+                         choice_set_indices,
+                         make_binary_var,
+                         name_variables=False)
 
         # Each choice set must have size choice_set_size.
         for choice_set_index in choice_set_indices:
-            members = choice_set_members.for_choice_set_index(choice_set_index)
-            member_vars = [x.variable for x in members]
+            member_vars = choice_set_members.variables_for_choice_set_index(
+                choice_set_index)
             model.Add(sum(member_vars) == parameters.choice_set_size)
 
+        # Choice sets are interchangeable, so any solution can be permuted
+        # into one where the choice sets are in decreasing lexicographic
+        # order of their membership vectors. With the vectors read as
+        # bitmasks, this is a single linear constraint per consecutive pair.
+        for choice_set_index, next_index in zip(choice_set_indices,
+                                                choice_set_indices[1:]):
+            model.Add(
+                sum(choice_set_members.mask_terms(choice_set_index)) >=
+                sum(choice_set_members.mask_terms(next_index)))
+
         # Each hit set must be hit by at least one choice set
         for hit_set in hit_sets:
             is_hits_for_hit_set = is_hits.for_hit_set(hit_set)
             is_hit_vars = [x.variable for x in is_hits_for_hit_set]
-            model.Add(sum(is_hit_vars) >= 1)
-
-        # For each choice set and IsHit, the IsHit value is 1 forces
-        # the corresponding hit set to have all its elements in the choice set.
-        for is_hit in is_hits.all():
-            choice_set_index = is_hit.choice_set_index
-            hit_set = is_hit.hit_set
+            model.AddBoolOr(is_hit_vars)
 
-            lhs = sum(
-                choice_set_members.for_choice_set_index_and_element(
-                    choice_set_index, element).variable for element in hit_set)
-            rhs = parameters.hit_set_size * is_hit.variable
-
-            # if IsHit == 1, then the LHS must be at least hit_set_size, but
-            # because there are only hit_set_size many terms in LHS, that is also
-            # the max value, so all the variables in LHS must equal 1, i.e., all
-            # the hit set elements are in the choice set.
-            model.Add(lhs >= rhs)
+        # Each IsHit is reified as the conjunction of the hit set's members
+        # in the choice set, which CP-SAT propagates in its SAT core rather
+        # than as the linear constraint sum(members) >= hit_set_size * IsHit.
+        # Grouped by choice set, so each choice set's row of member variables
+        # is fetched once and reused for all of its IsHits.
+        for choice_set_index in choice_set_indices:
+            member_row = choice_set_members.variables_for_choice_set_index(
+                choice_set_index)
+            for is_hit in is_hits.for_choice_set_index(choice_set_index):
+                member_vars = [
+                    member_row[element]
+                    for element in mask_elements(is_hit.hit_set)
+                ]
+                model.AddBoolAnd(member_vars).OnlyEnforceIf(is_hit.variable)
+                model.AddBoolOr([var.Not() for var in member_vars
+                                 ]).OnlyEnforceIf(is_hit.variable.Not())
+
+        # Warm start from a greedy cover. Choice sets the greedy cover did
+        # not need are left unhinted.
+        greedy_sets = greedy_cover(parameters.num_elements,
+                                   parameters.choice_set_size,
+                                   parameters.hit_set_size,
+                                   parameters.num_choice_sets)
+        for choice_set_index, choice_set in zip(choice_set_indices,
+                                                greedy_sets):
+            member_row = choice_set_members.variables_for_choice_set_index(
+                choice_set_index)
+            for element, var in enumerate(member_row):
+                model.AddHint(var, (choice_set >> element) & 1)
+            for is_hit in is_hits.for_choice_set_index(choice_set_index):
+                model.AddHint(is_hit.variable,
+                              int(is_hit.hit_set & ~choice_set == 0))
 
         time_limit_seconds = 60 * 15
         # model.SetTimeLimit(time_limit_seconds * 1000)
 
         solver = cp_model.CpSolver()
         solver.parameters.max_time_in_seconds = time_limit_seconds
+        solver.parameters.num_search_workers = NUM_SEARCH_WORKERS
 
         start = time()
         status = solver.Solve(model)
         end = time()
         elapsed = end - start
 
-        if status == cp_model.OPTIMAL:
+        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
             sets = []
             for choice_set_index in choice_set_indices:
                 members = choice_set_members.for_choice_set_index(
                     choice_set_index)
                 nonzero_members = tuple(
-                    sorted([
-                        x.element for x in members
-                        if solver.Value(x.variable) == 1
-                    ]))
+                    x.element for x in members
+                    if solver.Value(x.variable) == 1)
                 sets.append(nonzero_members)
             # return sorted(sets)
             return SubsetCoverSolution(status=SolveStatus.SOLVED,
@@ -2,7 +2,9 @@ from common_model import ChoiceSetMember
 from common_model import ChoiceSetMembers
 from common_model import IsHit
 from common_model import IsHits
+from common_model import greedy_cover
 from common_model import make_hit_sets
+from common_model import mask_elements
 from subset_cover import SolveStatus
 from subset_cover import SubsetCover
 from subset_cover import SubsetCoverParameters
@@ -12,57 +14,132 @@ from time import time
 
 from ortools.linear_solver import pywraplp
 
+# SCIP settings for a pure feasibility search. The LP is never solved, so
+# the LP-free primal heuristics that work by rounding and propagating
+# variable locks are run throughout the tree instead of only at the root.
+SCIP_PARAMETERS = "\n".join([
+    "lp/solvefreq = -1",
+    "heuristics/locks/freq = 10",
+    "heuristics/shiftandpropagate/freq = 10",
+    "",
+])
+
 
 class SubsetCoverILP(SubsetCover):
     '''
     An implementation of the subset cover problem formulated as
     an integer linear program.
     '''
+    def __init__(self, aggregate_is_hit_constraints: bool = False):
+        '''
+        If aggregate_is_hit_constraints, each IsHit is linked to its members
+        with the single constraint sum(members) >= hit_set_size * IsHit,
+        rather than one two-variable constraint member >= IsHit per member.
+        '''
+        self.aggregate_is_hit_constraints = aggregate_is_hit_constraints
+
     def solve(self, parameters: SubsetCoverParameters) -> SubsetCoverSolution:
         solver = pywraplp.Solver.CreateSolver('subset_cover', 'SCIP')
 
         def make_binary_var(name: str):
-            return solver.IntVar(0, 1, name)
+            return solver.BoolVar(name)
 
         elements = list(range(parameters.num_elements))
         choice_set_indices = list(range(parameters.num_choice_sets))
         hit_sets = make_hit_sets(elements, parameters.hit_set_size)
 
-        choice_set_members = ChoiceSetMembers(elements, choice_set_indices,
-                                              make_binary_var)
-        is_hits = IsHits(hit_sets, choice_set_indices, make_binary_var)
+        # Variables are only referenced by object, so they go unnamed.
+        choice_set_members = ChoiceSetMembers(elements,
+                                              choice_set_indices,
+                                              make_binary_var,
+                                              name_variables=False)
+        is_hits = IsHits(hit_sets,
+                         choice_set_indices,
+                         make_binary_var,
+                         name_variables=False)
 
         # Each choice set must have size choice_set_size.
         for choice_set_index in choice_set_indices:
-            members = choice_set_members.for_choice_set_index(choice_set_index)
-            member_vars = [x.variable for x in members]
-            solver.Add(sum(member_vars) == parameters.choice_set_size)
+            member_vars = choice_set_members.variables_for_choice_set_index(
+                choice_set_index)
+            solver.Add(solver.Sum(member_vars) == parameters.choice_set_size)
+
+        # Choice sets are interchangeable, so any solution can be permuted
+        # into one where the choice sets are in decreasing lexicographic
+        # order of their membership vectors. With the vectors read as
+        # bitmasks, this is a single linear constraint per consecutive pair.
+        for choice_set_index, next_index in zip(choice_set_indices,
+                                                choice_set_indices[1:]):
+            solver.Add(
+                solver.Sum(choice_set_members.mask_terms(choice_set_index)) >=
+                solver.Sum(choice_set_members.mask_terms(next_index)))
 
         # Each hit set must be hit by at least one choice set
         for hit_set in hit_sets:
             is_hits_for_hit_set = is_hits.for_hit_set(hit_set)
             is_hit_vars = [x.variable for x in is_hits_for_hit_set]
-            solver.Add(sum(is_hit_vars) >= 1)
+            solver.Add(solver.Sum(is_hit_vars) >= 1)
 
         # For each choice set and IsHit, the IsHit value is 1 forces
         # the corresponding hit set to have all its elements in the choice set.
-        for is_hit in is_hits.all():
-            choice_set_index = is_hit.choice_set_index
-            hit_set = is_hit.hit_set
-
-            lhs = sum(
-                choice_set_members.for_choice_set_index_and_element(
-                    choice_set_index, element).variable for element in hit_set)
-            rhs = parameters.hit_set_size * is_hit.variable
-
-            # if IsHit == 1, then the LHS must be at least hit_set_size, but
-            # because there are only hit_set_size many terms in LHS, that is also
-            # the max value, so all the variables in LHS must equal 1, i.e., all
-            # the hit set elements are in the choice set.
-            solver.Add(lhs >= rhs)
-
-        # The objective does not matter because we are looking for a feasible solution
-        solver.Maximize(1)
+        # Grouped by choice set, so each choice set's row of member variables
+        # is fetched once and reused for all of its IsHits.
+        for choice_set_index in choice_set_indices:
+            member_row = choice_set_members.variables_for_choice_set_index(
+                choice_set_index)
+            for is_hit in is_hits.for_choice_set_index(choice_set_index):
+                member_vars = [
+                    member_row[element]
+                    for element in mask_elements(is_hit.hit_set)
+                ]
+
+                # Conversely, if every member is present then IsHit is 1.
+                # With the constraints below this makes IsHit exactly the AND
+                # of its members, so presolve can substitute it away.
+                solver.Add(is_hit.variable >= solver.Sum(member_vars) -
+                           (parameters.hit_set_size - 1))
+
+                if not self.aggregate_is_hit_constraints:
+                    # Member >= IsHit for each member has the same integer
+                    # solutions, a tighter relaxation, and two nonzeros per
+                    # row, which SCIP's presolve handles well.
+                    for member_var in member_vars:
+                        solver.Add(member_var >= is_hit.variable)
+                    continue
+
+                lhs = solver.Sum(member_vars)
+                rhs = parameters.hit_set_size * is_hit.variable
+
+                # if IsHit == 1, then the LHS must be at least hit_set_size,
+                # but because there are only hit_set_size many terms in LHS,
+                # that is also the max value, so all the variables in LHS must
+                # equal 1, i.e., all the hit set elements are in the choice set.
+                solver.Add(lhs >= rhs)
+
+        # There is no objective because we are looking for a feasible
+        # solution, so the LP relaxation gives SCIP nothing to bound and it
+        # is never solved; see SCIP_PARAMETERS.
+        solver.SetSolverSpecificParametersAsString(SCIP_PARAMETERS)
+        # Warm start SCIP from a greedy cover. Choice sets the greedy cover
+        # did not need are left unhinted.
+        hint_vars = []
+        hint_values = []
+        greedy_sets = greedy_cover(parameters.num_elements,
+                                   parameters.choice_set_size,
+                                   parameters.hit_set_size,
+                                   parameters.num_choice_sets)
+        for choice_set_index, choice_set in zip(choice_set_indices,
+                                                greedy_sets):
+            member_row = choice_set_members.variables_for_choice_set_index(
+                choice_set_index)
+            for element, var in enumerate(member_row):
+                hint_vars.append(var)
+                hint_values.append((choice_set >> element) & 1)
+            for is_hit in is_hits.for_choice_set_index(choice_set_index):
+                hint_vars.append(is_hit.variable)
+                hint_values.append(int(is_hit.hit_set & ~choice_set == 0))
+        solver.SetHint(hint_vars, hint_values)
+
         time_limit_seconds = 60 * 15
         solver.SetTimeLimit(time_limit_seconds * 1000)
 
@@ -77,10 +154,8 @@ class SubsetCoverILP(SubsetCover):
                 members = choice_set_members.for_choice_set_index(
                     choice_set_index)
                 nonzero_members = tuple(
-                    sorted([
-                        x.element for x in members
-                        if x.variable.solution_value() == 1
-                    ]))
+                    x.element for x in members
+                    if x.variable.solution_value() == 1)
                 sets.append(nonzero_members)
             # return sorted(sets)
             return SubsetCoverSolution(status=SolveStatus.SOLVED,
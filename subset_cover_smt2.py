@@ -0,0 +1,266 @@
+from common_model import make_subset_tuples
+from io import StringIO
+from subprocess import run
+from subset_cover import SolveStatus
+from subset_cover import SubsetCoverParameters
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+import re
+
+
+def member_name(choice_set_index: int, element: int) -> str:
+    return f"Member_{choice_set_index}_{element}"
+
+
+def use_name(choice_set_index: int) -> str:
+    return f"Use_{choice_set_index}"
+
+
+def _and(terms) -> str:
+    return terms[0] if len(terms) == 1 else f"(and {' '.join(terms)})"
+
+
+def _or(terms) -> str:
+    if not terms:
+        return "false"
+    return terms[0] if len(terms) == 1 else f"(or {' '.join(terms)})"
+
+
+def _weighted_sum(relation: str, bound: int,
+                  weighted_literals: List[Tuple[int, str]],
+                  linear_arithmetic: bool) -> str:
+    '''
+    The constraint sum(weight * literal) relation bound, for relation "="
+    or ">=", as a z3 pseudo-boolean term or in standard linear arithmetic.
+    '''
+    if not linear_arithmetic:
+        name = "pbeq" if relation == "=" else "pbge"
+        weights = " ".join(str(weight) for weight, _ in weighted_literals)
+        literals = " ".join(literal for _, literal in weighted_literals)
+        return f"((_ {name} {bound} {weights}) {literals})"
+
+    terms = [f"(ite {literal} {weight} 0)"
+             for weight, literal in weighted_literals]
+    total = terms[0] if len(terms) == 1 else f"(+ {' '.join(terms)})"
+    return f"({relation} {total} {bound})"
+
+
+def encode_to_smt2(parameters: SubsetCoverParameters,
+                   optional_choice_sets: bool = False,
+                   linear_arithmetic: bool = False) -> str:
+    '''
+    The cardinality encoding of the subset cover problem as SMT-LIB2 text.
+
+    Building the constraints through the z3 Python API creates a Python
+    wrapper object for every intermediate term, which dominates model
+    construction for larger instances. Instead the assertions are written
+    as text and parsed by z3 in one call.
+
+    If optional_choice_sets, each choice set i gets a Use_i switch, and an
+    unused choice set is empty rather than of size choice_set_size. Used
+    choice sets form a prefix, so asserting not Use_j allows at most j
+    choice sets.
+
+    The cardinality constraints use z3's pseudo-boolean extension unless
+    linear_arithmetic, in which case they are QF_LIA sums for solvers that
+    only accept standard SMT-LIB.
+    '''
+    elements = list(range(parameters.num_elements))
+    choice_sets = list(range(parameters.num_choice_sets))
+    hit_sets = make_subset_tuples(elements, parameters.hit_set_size)
+    member_names = [[member_name(choice_set_index, element)
+                     for element in elements]
+                    for choice_set_index in choice_sets]
+
+    out = StringIO()
+    for row in member_names:
+        for name in row:
+            out.write(f"(declare-const {name} Bool)\n")
+
+    # each choice set must have a specific size
+    choice_set_size = parameters.choice_set_size
+    for choice_set_index, row in enumerate(member_names):
+        row_terms = [(1, name) for name in row]
+        if not optional_choice_sets:
+            size = _weighted_sum("=", choice_set_size, row_terms,
+                                 linear_arithmetic)
+            out.write(f"(assert {size})\n")
+            continue
+
+        # sum(row) + choice_set_size * (not Use_i) == choice_set_size
+        use = use_name(choice_set_index)
+        out.write(f"(declare-const {use} Bool)\n")
+        row_terms.append((choice_set_size, f"(not {use})"))
+        size = _weighted_sum("=", choice_set_size, row_terms,
+                             linear_arithmetic)
+        out.write(f"(assert {size})\n")
+        if choice_set_index > 0:
+            out.write(f"(assert (or (not {use}) "
+                      f"{use_name(choice_set_index - 1)}))\n")
+
+    # Choice sets are interchangeable, so any solution can be permuted into
+    # one where the choice sets are in decreasing order of their element
+    # bitmasks. With weights w_e = 2^e, mask(i) >= mask(i+1) is
+    #
+    #   sum(w_e * M_(i,e)) + sum(w_e * not M_(i+1,e)) >= sum(w_e)
+    #
+    # Unused optional choice sets are empty, so they sort last as required.
+    total_weight = (1 << len(elements)) - 1
+    for row, next_row in zip(member_names, member_names[1:]):
+        lex_terms = [(1 << elt, row[elt]) for elt in elements]
+        lex_terms.extend(
+            (1 << elt, f"(not {next_row[elt]})") for elt in elements)
+        lex = _weighted_sum(">=", total_weight, lex_terms, linear_arithmetic)
+        out.write(f"(assert {lex})\n")
+
+    '''
+    Every hit set must be contained in some choice set. For a hit set
+    like (1,2), this is the disjunction
+
+          Member(1, 1) AND Member(1, 2)
+          OR Member(2, 1) AND Member(2, 2)
+          OR ...
+
+    Each hit set used to get a Hit variable, asserted true, with
+    implications in both directions between Hit and its members. Since
+    Hit is a constant, the Member => Hit implications are vacuous and
+    Hit => OR(...) is just OR(...), so the disjunction is asserted
+    directly.
+    '''
+    for hit_set in hit_sets:
+        conjunctions = [_and([row[elt] for elt in hit_set])
+                        for row in member_names]
+        out.write(f"(assert {_or(conjunctions)})\n")
+
+    return out.getvalue()
+
+
+# Translate the cardinality constraints to bit-vector circuits and solve
+# with the SAT tactic, skipping the SMT core. Opt-in: with symmetry
+# breaking, z3's default solver is faster on most instances with n >= 8,
+# e.g. 1.9s vs 7.3s on (10, 5, 3, 24), though the chain is ahead on some
+# infeasible ones, e.g. 3.2s vs 4.4s on (8, 4, 3, 13).
+CARDINALITY_TACTICS = ("simplify", "propagate-values", "card2bv", "sat")
+
+
+BACKENDS = ("z3", "cvc5")
+
+_MODEL_ENTRY = re.compile(
+    r"\(define-fun (\S+) \(\) Bool\s+(true|false)\)")
+
+
+def write_smt2(parameters: SubsetCoverParameters,
+               path: str,
+               backend: str = "z3",
+               tactics: Optional[Sequence[str]] = None,
+               produce_model: bool = False) -> None:
+    '''
+    Write the cardinality encoding to path as a complete SMT-LIB2 script
+    for the given backend. For z3, the script checks satisfiability with
+    the given tactics, or z3's default solver if None. If produce_model,
+    the script prints the model after a sat result.
+    '''
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown backend {backend}, expected one of {BACKENDS}")
+
+    with open(path, "w") as f:
+        if produce_model:
+            f.write("(set-option :produce-models true)\n")
+        if backend == "z3":
+            f.write(encode_to_smt2(parameters))
+        else:
+            f.write("(set-logic QF_LIA)\n")
+            f.write(encode_to_smt2(parameters, linear_arithmetic=True))
+
+        if backend == "z3" and tactics is not None:
+            f.write(f"(check-sat-using (then {' '.join(tactics)}))\n")
+        else:
+            f.write("(check-sat)\n")
+        if produce_model:
+            f.write("(get-model)\n")
+
+
+def _run_solver(command: List[str]
+                ) -> Tuple[SolveStatus, Dict[str, bool]]:
+    '''
+    Run a solver binary on a script written by write_smt2 and parse its
+    output. The first line of output is the check-sat result, unless the
+    solver rejected the script, in which case it is an error. An error
+    after the result, e.g. from (get-model) after unsat, is expected.
+    '''
+    try:
+        result = run(command, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise RuntimeError(
+            f"Solver binary {command[0]} was not found on the PATH") from None
+
+    lines = result.stdout.splitlines()
+    first_line = lines[0].strip() if lines else ""
+    if first_line.startswith("(error"):
+        raise RuntimeError(f"{command[0]} rejected the script: {first_line}")
+
+    if first_line == "sat":
+        status = SolveStatus.SOLVED
+    elif first_line == "unsat":
+        status = SolveStatus.INFEASIBLE
+    elif first_line in ("unknown", "timeout"):
+        status = SolveStatus.UNKNOWN
+    elif result.returncode != 0:
+        raise RuntimeError(f"{command[0]} exited with code "
+                           f"{result.returncode}: {result.stderr.strip()}")
+    else:
+        status = SolveStatus.UNKNOWN
+
+    model = {}
+    if status == SolveStatus.SOLVED:
+        model = {
+            name: value == "true"
+            for name, value in _MODEL_ENTRY.findall(result.stdout)
+        }
+    return status, model
+
+
+def run_z3(path: str,
+           timeout_seconds: int = 60 * 15
+           ) -> Tuple[SolveStatus, Dict[str, bool]]:
+    '''
+    Solve a script written by write_smt2 with the z3 binary, returning the
+    status and the model's boolean assignments, if the script asked for one.
+    Raises RuntimeError if the binary is missing or rejects the script.
+
+    This module does not import z3, so the encoding can run under an
+    interpreter without the z3 bindings (e.g., pypy3) and the solve happens
+    out of process.
+    '''
+    return _run_solver([
+        "z3", "-smt2", f"-T:{timeout_seconds}", "sat.cardinality.solver=true",
+        path
+    ])
+
+
+def run_cvc5(path: str,
+             timeout_seconds: int = 60 * 15
+             ) -> Tuple[SolveStatus, Dict[str, bool]]:
+    '''
+    Like run_z3, but with the cvc5 binary on a script written for the cvc5
+    backend.
+    '''
+    return _run_solver([
+        "cvc5", "--lang", "smt2", f"--tlimit-per={1000 * timeout_seconds}",
+        path
+    ])
+
+
+def run_smt2(path: str,
+             backend: str = "z3",
+             timeout_seconds: int = 60 * 15
+             ) -> Tuple[SolveStatus, Dict[str, bool]]:
+    runners = {"z3": run_z3, "cvc5": run_cvc5}
+    if backend not in runners:
+        raise ValueError(
+            f"Unknown backend {backend}, expected one of {BACKENDS}")
+    return runners[backend](path, timeout_seconds)
@@ -1,7 +1,8 @@
-from collections import defaultdict
-from common_model import HitSet
+from common_model import iter_submasks
+from common_model import make_hit_sets
+from common_model import make_subset_masks
+from common_model import mask_elements
 from dataclasses import dataclass
-from itertools import combinations
 from itertools import product
 from subset_cover import SolveStatus
 from subset_cover import SubsetCover
@@ -15,7 +16,6 @@ from z3 import And
 from z3 import AtLeast
 from z3 import AtMost
 from z3 import Bool
-from z3 import Implies
 from z3 import Or
 from z3 import Solver
 from z3 import sat
@@ -39,68 +39,54 @@ class SubsetCoverZ3BruteForce(SubsetCover):
         choice_set_size = parameters.choice_set_size
         hit_set_size = parameters.hit_set_size
         elements = list(range(parameters.num_elements))
-        choice_sets = [
-            ChoiceSet(set_size=choice_set_size,
-                      elements=elts,
-                      variable=Bool(f"Choice_{elts}"))
-            for elts in combinations(elements, choice_set_size)
-        ]
-
-        hit_sets = dict((tuple(sorted(elts)),
-                         HitSet(set_size=hit_set_size,
-                                elements=elts,
-                                variable=Bool(f"Hit_{elts}")))
-                        for elts in combinations(elements, hit_set_size))
+        # Choice sets and hit sets are keyed by their element bitmasks, so
+        # the hit sets inside a choice set are enumerated as submasks rather
+        # than as element tuples that have to be hashed back to a HitSet.
+        choice_sets = {
+            mask: ChoiceSet(set_size=choice_set_size,
+                            elements=mask_elements(mask),
+                            variable=Bool(f"Choice_{mask_elements(mask)}"))
+            for mask in make_subset_masks(elements, choice_set_size)
+        }
 
-        implications = []
         '''
-        For a choice set like (1,2,3), we construct the implication,
-        for each subset of size hit_set_size (e.g. = 2),
+        Every hit set must be contained in some chosen choice set. For a hit
+        set like (1,2), this is the clause
 
-            Choice_(1,2,3) => Hit_(1,2)
-            Choice_(1,2,3) => Hit_(2,3)
-            Choice_(1,2,3) => Hit_(1,3)
-
-        '''
-        # also builds up this index
-        hit_set_to_choice_set_lookup = defaultdict(set)
-        for choice_set in choice_sets:
-            for hit_set_key in combinations(choice_set.elements, hit_set_size):
-                hit_set = hit_sets[tuple(sorted(hit_set_key))]
-                hit_set_to_choice_set_lookup[hit_set].add(choice_set)
-                implications.append(
-                    Implies(choice_set.variable, hit_set.variable))
-        '''
-        For a hit set like (1,2), we construct the implication:
+            Choice(1,2,3) OR Choice(1,2,4) OR ...
 
-            Hit_(1,2) =>
-              Choice(1,2,3) OR
-              Choice(1,2,4) OR
-              ...
+        Each hit set used to get a Hit variable, asserted true, with
+        Choice => Hit and Hit => OR(...) implications. Since Hit is a
+        constant, the former are vacuous and the latter is just the clause,
+        so the clause is asserted directly.
         '''
-        for hit_set in hit_sets.values():
-            relevant_choice_set_vars = [
-                choice_set.variable
-                for choice_set in hit_set_to_choice_set_lookup[hit_set]
-            ]
-            implications.append(
-                Implies(hit_set.variable, Or(*relevant_choice_set_vars)))
+        hit_set_to_choice_set_lookup = {
+            mask: [] for mask in make_hit_sets(elements, hit_set_size)
+        }
+        for choice_mask, choice_set in choice_sets.items():
+            for hit_mask in iter_submasks(choice_mask, hit_set_size):
+                hit_set_to_choice_set_lookup[hit_mask].append(choice_set)
+
+        coverage = [
+            Or(*[choice_set.variable for choice_set in relevant_choice_sets])
+            for relevant_choice_sets in hit_set_to_choice_set_lookup.values()
+        ]
 
         args = [cs.variable
-                for cs in choice_sets] + [parameters.num_choice_sets]
+                for cs in choice_sets.values()] + [parameters.num_choice_sets]
         choice_sets_at_most = AtMost(*args)
         choice_sets_at_least = AtLeast(*args)
 
         solver = Solver()
         solver.set("timeout", 1000 * 60 * 15)
-        for hit_set in hit_sets.values():
-            solver.add(hit_set.variable)  # all must be hit
+        solver.add(*coverage)
+        solver.add(choice_sets_at_most, choice_sets_at_least)
 
-        for impl in implications:
-            solver.add(impl)
-
-        solver.add(choice_sets_at_most)
-        solver.add(choice_sets_at_least)
+        # Renaming elements preserves covers, so any cover can be relabeled
+        # to one that chooses the first choice set, (0, 1, ..., k-1).
+        first_choice_set = (1 << choice_set_size) - 1
+        if parameters.num_choice_sets > 0 and first_choice_set in choice_sets:
+            solver.add(choice_sets[first_choice_set].variable)
 
         # print(solver.to_smt2())
 
@@ -118,10 +104,8 @@ class SubsetCoverZ3BruteForce(SubsetCover):
 
         model = solver.model()
         chosen_sets = [
-            c.elements for c in choice_sets if model.evaluate(c.variable)
-        ]
-        actual_hit_sets = [
-            h.elements for h in hit_sets.values() if model.evaluate(h.variable)
+            c.elements for c in choice_sets.values()
+            if model.evaluate(c.variable)
         ]
         n = len(elements)
         max_hits = int(n * (n - 1) / 2)
@@ -1,25 +1,29 @@
 from collections import defaultdict
-from common_model import ChoiceSetMember
-from common_model import ChoiceSetMembers
-from common_model import HitSet
+from common_model import greedy_cover
 from dataclasses import dataclass
-from itertools import combinations
 from itertools import product
+from math import ceil
+from math import comb
 from subset_cover import SolveStatus
 from subset_cover import SubsetCover
 from subset_cover import SubsetCoverParameters
 from subset_cover import SubsetCoverSolution
-from subset_cover import print_table
+from subset_cover_smt2 import encode_to_smt2
+from subset_cover_smt2 import member_name
+from subset_cover_smt2 import run_smt2
+from subset_cover_smt2 import use_name
+from subset_cover_smt2 import write_smt2
+from tempfile import TemporaryDirectory
 from time import time
 from typing import Any
 from typing import List
-from z3 import And
-from z3 import AtLeast
-from z3 import AtMost
+from typing import Optional
+from typing import Sequence
 from z3 import Bool
-from z3 import Implies
-from z3 import Or
+from z3 import Not
 from z3 import Solver
+from z3 import Then
+from z3 import is_true
 from z3 import sat
 from z3 import unknown
 from z3 import unsat
@@ -33,74 +37,38 @@ class SubsetCoverZ3Cardinality(SubsetCover):
 
     Uses cardinality constraints instead of integer inequalities.
     '''
-    def solve(self, parameters: SubsetCoverParameters) -> SubsetCoverSolution:
-        elements = list(range(parameters.num_elements))
-        choice_sets = list(range(parameters.num_choice_sets))
-        hit_set_size = parameters.hit_set_size
-
-        choice_set_members = ChoiceSetMembers(elements, choice_sets, Bool)
-
-        # each choice set must have a specific size
-        choice_set_size_constraints = []
-        for memberships in choice_set_members.grouped_by_choice_set():
-            args = [mem.variable for mem in memberships] + [parameters.choice_set_size]
-            choice_set_size_constraints.append(AtMost(args))
-            choice_set_size_constraints.append(AtLeast(args))
-
-        hit_sets = dict((tuple(sorted(elts)),
-                         HitSet(set_size=hit_set_size,
-                                elements=elts,
-                                variable=Bool(f"Hit_{elts}")))
-                        for elts in combinations(elements, hit_set_size))
-
-        implications = []
-        '''
-        For a hit set like (1,2), we construct the implication,
-        for each choice set i,
-
-            Member_(i,1) and Member_(i,2) => Hit_(1,2)
-
-        '''
-        for choice_set_index in choice_sets:
-            mems = choice_set_members.for_choice_set_index(choice_set_index)
-            for membership_subset in combinations(mems, hit_set_size):
-                hit_set = hit_sets[tuple(
-                    sorted([mem.element for mem in membership_subset]))]
-                implications.append(
-                    Implies(
-                        And(*[mem.variable for mem in membership_subset]),
-                        hit_set.variable))
+    def __init__(self,
+                 tactics: Optional[Sequence[str]] = None,
+                 timeout_seconds: int = 60 * 15,
+                 verbose: bool = False,
+                 backend: Optional[str] = None):
         '''
-        For a hit set like (1,2), we construct the implication:
-
-            Hit_(1,2) =>
-              Member(1, 1) AND Member(1, 2)
-              OR Member(2, 1) AND Member(2, 2)
-              OR ...
+        tactics names the z3 tactics to chain into the solver, e.g.
+        subset_cover_smt2.CARDINALITY_TACTICS, or None (the default) to use
+        z3's default solver. If verbose, print the chosen sets after a
+        successful solve.
+
+        By default the solve runs in process through the z3 bindings.
+        Otherwise backend is "z3" or "cvc5", and the encoding is written to
+        an SMT-LIB2 file and solved by that solver's binary, so the solve
+        time includes parsing the file.
         '''
-        for hit_set in hit_sets.values():
-            clauses = []
+        self.tactics = tactics
+        self.timeout_seconds = timeout_seconds
+        self.verbose = verbose
+        self.backend = backend
 
-            for choice_set_index in choice_sets:
-                mems = [
-                    choice_set_members.for_choice_set_index_and_element(choice_set_index, elt)
-                    for elt in hit_set.elements
-                ]
-                clauses.append(And(*[mem.variable for mem in mems]))
-
-            implications.append(Implies(hit_set.variable, Or(*clauses)))
-
-        solver = Solver()
-        solver.set("timeout", 1000 * 60 * 15)
+    def solve(self, parameters: SubsetCoverParameters) -> SubsetCoverSolution:
+        if self.backend is not None:
+            return self.solve_out_of_process(parameters)
+
+        if self.tactics is None:
+            solver = Solver()
+        else:
+            solver = Then(*self.tactics).solver()
+        solver.set("timeout", 1000 * self.timeout_seconds)
         solver.set("sat.cardinality.solver", True)
-        for size_constraint in choice_set_size_constraints:
-            solver.add(size_constraint)
-
-        for hit_set in hit_sets.values():
-            solver.add(hit_set.variable)
-
-        for impl in implications:
-            solver.add(impl)
+        solver.from_string(encode_to_smt2(parameters))
 
         start = time()
         result = solver.check()
@@ -113,35 +81,114 @@ class SubsetCoverZ3Cardinality(SubsetCover):
             return SubsetCoverSolution(status=SolveStatus.UNKNOWN,
                                        solve_time_seconds=end - start)
 
-        model = solver.model()
+        if self.verbose:
+            model = solver.model()
+            self.print_choice_sets(
+                parameters, lambda name: is_true(model.evaluate(Bool(name))))
+
+        return SubsetCoverSolution(status=SolveStatus.SOLVED,
+                                   solve_time_seconds=end - start)
+
+    def solve_out_of_process(
+            self, parameters: SubsetCoverParameters) -> SubsetCoverSolution:
+        with TemporaryDirectory() as tmpdir:
+            path = f"{tmpdir}/subset_cover.smt2"
+            write_smt2(parameters,
+                       path,
+                       backend=self.backend,
+                       tactics=self.tactics,
+                       produce_model=self.verbose)
+
+            start = time()
+            status, model = run_smt2(path, self.backend, self.timeout_seconds)
+            end = time()
+
+        if status == SolveStatus.SOLVED and self.verbose:
+            self.print_choice_sets(parameters,
+                                   lambda name: model.get(name, False))
+
+        return SubsetCoverSolution(status=status,
+                                   solve_time_seconds=end - start)
 
+    def print_choice_sets(self, parameters: SubsetCoverParameters,
+                          is_member) -> None:
         realized_choice_sets = []
-        for choice_set_index in choice_sets:
-            mems = choice_set_members.for_choice_set_index(choice_set_index)
-            choice_set = list(
-                sorted([
-                    mem.element for mem in mems
-                    if model.evaluate(mem.variable)
-                ]))
+        for choice_set_index in range(parameters.num_choice_sets):
+            choice_set = [
+                element for element in range(parameters.num_elements)
+                if is_member(member_name(choice_set_index, element))
+            ]
             realized_choice_sets.append(choice_set)
 
-        '''
-        print(
-            f"Chose {len(realized_choice_sets)} sets: {realized_choice_sets}")
-        '''
-        return SubsetCoverSolution(status=SolveStatus.SOLVED,
-                                   solve_time_seconds=end - start)
+        print(f"Chose {len(realized_choice_sets)} sets: "
+              f"{realized_choice_sets}")
+
+
+def min_num_choice_sets(num_elements, choice_set_size, hit_set_size,
+                        timeout_seconds: int = 60 * 15) -> Optional[int]:
+    '''
+    The fewest choice sets that cover every hit set, found by binary
+    searching on the number of choice sets in the cardinality encoding, or
+    None if no cover exists, some check was inconclusive, or the search ran
+    past timeout_seconds, which bounds all the checks together.
+
+    Each choice set contains at most (choice_set_size choose hit_set_size)
+    hit sets, which bounds the answer from below, and a greedy cover bounds
+    it from above without a solve. The encoding grows with the number of
+    choice sets, so it only has as many optional choice sets as the greedy
+    cover uses.
+    '''
+    if not hit_set_size <= choice_set_size <= num_elements:
+        return None
+
+    num_hit_sets = comb(num_elements, hit_set_size)
+    lower = ceil(num_hit_sets / comb(choice_set_size, hit_set_size))
+    upper = len(
+        greedy_cover(num_elements, choice_set_size, hit_set_size,
+                     num_hit_sets))
+
+    # One solver holds the encoding with upper optional choice sets, and each
+    # check bounds the number used with an assumption, so clauses learned in
+    # one check carry over to the next. Tactic solvers are not incremental,
+    # so this uses the default solver.
+    solver = Solver()
+    solver.set("sat.cardinality.solver", True)
+    solver.from_string(
+        encode_to_smt2(SubsetCoverParameters(num_elements=num_elements,
+                                             choice_set_size=choice_set_size,
+                                             hit_set_size=hit_set_size,
+                                             num_choice_sets=upper),
+                       optional_choice_sets=True))
+
+    start = time()
+    while lower < upper:
+        remaining_seconds = timeout_seconds - (time() - start)
+        if remaining_seconds <= 0:
+            return None
+
+        num_choice_sets = (lower + upper) // 2
+        solver.set("timeout", int(1000 * remaining_seconds))
+        result = solver.check(Not(Bool(use_name(num_choice_sets))))
+
+        if result == sat:
+            # The cover found may use fewer choice sets than allowed.
+            model = solver.model()
+            upper = sum(1 for choice_set_index in range(num_choice_sets)
+                        if is_true(model.evaluate(
+                            Bool(use_name(choice_set_index)))))
+        elif result == unsat:
+            lower = num_choice_sets + 1
+        else:
+            return None
+
+    return lower
 
 
 if __name__ == "__main__":
-    from math import comb
-
-    for n in range(8, 16):
-        k = int(n / 2)
-        l = 3
-        max_num_sets = int(2 * comb(n, l) / comb(k, l))
-        params = SubsetCoverParameters(num_elements=n,
-                                       choice_set_size=k,
-                                       hit_set_size=l,
-                                       num_choice_sets=max_num_sets)
-        print_table(params, SubsetCoverZ3Cardinality().solve(params), header=(n == 8))
+    # Only small instances are decided within the time limit. At n=9, k=4,
+    # l=3 the search does not finish in 10 minutes.
+    instances = ([(n, 3, 2) for n in range(5, 10)] +
+                 [(n, 4, 3) for n in range(6, 9)])
+    print("num_elements,choice_set_size,hit_set_size,min_num_choice_sets")
+    for n, k, l in instances:
+        print(f"{n},{k},{l},{min_num_choice_sets(n, k, l)}")
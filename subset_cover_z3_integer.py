@@ -1,9 +1,8 @@
 from collections import defaultdict
 from common_model import ChoiceSetMember
 from common_model import ChoiceSetMembers
-from common_model import HitSet
+from common_model import make_subset_tuples
 from dataclasses import dataclass
-from itertools import combinations
 from itertools import product
 from math import comb
 from subset_cover import SolveStatus
@@ -15,7 +14,6 @@ from time import time
 from typing import Any
 from typing import List
 from z3 import And
-from z3 import Implies
 from z3 import Int
 from z3 import Or
 from z3 import Solver
@@ -39,70 +37,62 @@ class SubsetCoverZ3Integer(SubsetCover):
 
         # each choice set must have a specific size
         choice_set_size_constraints = [
-            sum(mem.variable
-                for mem in memberships) == parameters.choice_set_size
-            for memberships in choice_set_members.grouped_by_choice_set()
+            sum(member_vars) == parameters.choice_set_size for member_vars in
+            choice_set_members.variables_grouped_by_choice_set()
         ]
 
-        hit_sets = dict((tuple(sorted(elts)),
-                         HitSet(set_size=hit_set_size,
-                                elements=elts,
-                                variable=Int(f"Hit_{elts}")))
-                        for elts in combinations(elements, hit_set_size))
+        # Choice sets are interchangeable, so any solution can be permuted
+        # into one where the choice sets are in decreasing order of their
+        # element bitmasks, sum(2^e * Member(i, e)).
+        symmetry_breaking_constraints = [
+            sum(choice_set_members.mask_terms(choice_set_index)) >=
+            sum(choice_set_members.mask_terms(next_index))
+            for choice_set_index, next_index in zip(choice_sets,
+                                                    choice_sets[1:])
+        ]
 
-        implications = []
         '''
-        For a hit set like (1,2), we construct the implication,
-        for each choice set i,
-
-            Member_(i,1) == 1 and Member_(i,2) == 1 => Hit_(1,2) == 1
+        Every hit set must be contained in some choice set. For a hit set
+        like (1,2), this is the disjunction
 
-        '''
-        for choice_set_index in choice_sets:
-            mems = choice_set_members.for_choice_set_index(choice_set_index)
-            for membership_subset in combinations(mems, hit_set_size):
-                hit_set = hit_sets[tuple(
-                    sorted([mem.element for mem in membership_subset]))]
-                implications.append(
-                    Implies(
-                        And(*[mem.variable == 1 for mem in membership_subset]),
-                        hit_set.variable == 1))
-        '''
-        For a hit set like (1,2), we construct the implication:
-
-            Hit_(1,2) == 1 =>
               Member(1, 1) == 1 AND Member(1, 2) == 1
               OR
               Member(2, 1) == 1 AND Member(2, 2) == 1
               OR
               ...
+
+        Each hit set used to get a Hit variable, asserted equal to 1, with
+        implications in both directions between Hit and its members. Since
+        Hit is a constant, the Member => Hit implications are vacuous and
+        Hit == 1 => OR(...) is just OR(...), so the disjunction is asserted
+        directly.
         '''
-        for hit_set in hit_sets.values():
+        # is_member[choice_set][element] is the atom Member(i, e) == 1, built
+        # once and shared by every clause that mentions it.
+        is_member = [[var == 1 for var in member_vars] for member_vars in
+                     choice_set_members.variables_grouped_by_choice_set()]
+
+        coverage_constraints = []
+        for hit_set in make_subset_tuples(elements, hit_set_size):
             clauses = []
 
             for choice_set in choice_sets:
-                mems = [
-                    choice_set_members.for_choice_set_index_and_element(
-                        choice_set, elt) for elt in hit_set.elements
-                ]
-                clauses.append(And(*[mem.variable == 1 for mem in mems]))
+                atoms = is_member[choice_set]
+                clauses.append(And(*[atoms[elt] for elt in hit_set]))
 
-            implications.append(Implies(hit_set.variable == 1, Or(*clauses)))
+            coverage_constraints.append(Or(*clauses))
 
         solver = Solver()
         solver.set("timeout", 60 * 15 * 1000)
-        for size_constraint in choice_set_size_constraints:
-            solver.add(size_constraint)
-
+        bounds = []
         for var in choice_set_members.all_variables():
-            solver.add(var >= 0)
-            solver.add(var <= 1)
-
-        for hit_set in hit_sets.values():
-            solver.add(hit_set.variable == 1)
+            bounds.append(var >= 0)
+            bounds.append(var <= 1)
 
-        for impl in implications:
-            solver.add(impl)
+        solver.add(*choice_set_size_constraints)
+        solver.add(*bounds)
+        solver.add(*symmetry_breaking_constraints)
+        solver.add(*coverage_constraints)
 
         start = time()
         result = solver.check()
@@ -120,11 +110,10 @@ class SubsetCoverZ3Integer(SubsetCover):
         realized_choice_sets = []
         for choice_set_index in choice_sets:
             mems = choice_set_members.for_choice_set_index(choice_set_index)
-            choice_set = list(
-                sorted([
-                    mem.element for mem in mems
-                    if model.evaluate(mem.variable).as_long() > 0
-                ]))
+            choice_set = [
+                mem.element for mem in mems
+                if model.evaluate(mem.variable).as_long() > 0
+            ]
             realized_choice_sets.append(choice_set)
         '''
         print(